@@ -1,7 +1,7 @@
 ''' Customize and draw the hexagonal Truchet tile image '''
 from typing import Sequence
+import functools
 import math
-from xml.etree import ElementTree as ET
 from hexgrid import HexGrid
 
 
@@ -33,50 +33,136 @@ e__ = f'{3*HexGrid.TILEW/4+ext} {7*HexGrid.TILEH/8+ext60*2}'
 f__ = f'{HexGrid.TILEW/4-ext} {7*HexGrid.TILEH/8+ext60*2}'
 
 
-def path(start, end, color: str, stroke: str) -> ET.Element:
-    ''' Get SVG path element connecting start and end '''
-    line = ET.Element('path')
-    line.set('d', pathd(start, end))
-    line.set('stroke', color)
-    line.set('stroke-width', stroke)
-    line.set('fill', 'none')
-    return line
-
-
-def pathd(start: tuple[float, float], end: tuple[float, float]) -> str:
-    ''' Get SVG path `d` parameter connecting start and end coordinates '''
-    return {
-        (a_, f_): f'M {a_} L {a} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 1 {f} L {f_}',
-        (b_, c_): f'M {b_} L {b} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {c} L {c_}',
-        (d_, e_): f'M {d_} L {d} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {e} L {e_}',
-        (c_, d_): f'M {c_} L {c} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {d} L {d_}',
-        (b_, e_): f'M {b_} L {e_}',
-        (a_, d_): f'M {a_} L {d_}',
-        (c_, f_): f'M {c_} L {f_}',
-        (a_, c_): f'M {a_} L {a} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {c} L {c_}',
-        (b_, f_): f'M {b_} L {b} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {f} L {f_}',
-        (a_, None): f'M {a_} L {HexGrid.TILEW/8} {HexGrid.TILEH/2}',
-
-        (a__, f__): f'M {a__} L {a} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 1 {f} L {f__}',
-        (b__, c__): f'M {b__} L {b} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {c} L {c__}',
-        (d__, e__): f'M {d__} L {d} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {e} L {e__}',
-        (c__, d__): f'M {c__} L {c} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {d} L {d__}',
-        (b__, e__): f'M {b__} L {e__}',
-        (a__, d__): f'M {a__} L {d__}',
-        (c__, f__): f'M {c__} L {f__}',
-        (a__, c__): f'M {a__} L {a} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {c} L {c__}',
-        (b__, f__): f'M {b__} L {b} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {f} L {f__}',
-        (a, None): f'M {a} L {HexGrid.TILEW/8} {HexGrid.TILEH/2}',
-    }.get((start, end))
-
-
-def basesymbol(name: str) -> ET.Element:
-    ''' Get SVG <symbol> to build different tiles on '''
-    symbol = ET.Element('symbol')
-    symbol.set('id', name)
-    symbol.set('width', str(HexGrid.TILEW))
-    symbol.set('height', str(HexGrid.TILEH))
-    return symbol
+# Path `d` strings for every (start, end) connection. The entries only
+# depend on class constants, so build the table once at import rather
+# than on every `make_path` call.
+_PATHD: dict[tuple[str, str | None], str] = {
+    (a_, f_): f'M {a_} L {a} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 1 {f} L {f_}',
+    (b_, c_): f'M {b_} L {b} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {c} L {c_}',
+    (d_, e_): f'M {d_} L {d} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {e} L {e_}',
+    (c_, d_): f'M {c_} L {c} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {d} L {d_}',
+    (b_, e_): f'M {b_} L {e_}',
+    (a_, d_): f'M {a_} L {d_}',
+    (c_, f_): f'M {c_} L {f_}',
+    (a_, c_): f'M {a_} L {a} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {c} L {c_}',
+    (b_, f_): f'M {b_} L {b} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {f} L {f_}',
+    (a_, None): f'M {a_} L {HexGrid.TILEW/8} {HexGrid.TILEH/2}',
+
+    (a__, f__): f'M {a__} L {a} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 1 {f} L {f__}',
+    (b__, c__): f'M {b__} L {b} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {c} L {c__}',
+    (d__, e__): f'M {d__} L {d} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {e} L {e__}',
+    (c__, d__): f'M {c__} L {c} A {HexGrid.EDGELEN/2} {HexGrid.EDGELEN/2} 0 0 0 {d} L {d__}',
+    (b__, e__): f'M {b__} L {e__}',
+    (a__, d__): f'M {a__} L {d__}',
+    (c__, f__): f'M {c__} L {f__}',
+    (a__, c__): f'M {a__} L {a} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {c} L {c__}',
+    (b__, f__): f'M {b__} L {b} Q {HexGrid.TILEW/2} {HexGrid.TILEW/2} {f} L {f__}',
+    (a, None): f'M {a} L {HexGrid.TILEW/8} {HexGrid.TILEH/2}',
+}
+
+
+def make_path(start, end, color: str, stroke: str, linecap: str = '',
+              name: str = '') -> str:
+    ''' Get SVG <path> fragment connecting start and end coordinates '''
+    cap = f' stroke-linecap="{linecap}"' if linecap else ''
+    ident = f' id="{name}"' if name else ''
+    return (f'<path{ident} d="{_PATHD.get((start, end))}" stroke="{color}" '
+            f'stroke-width="{stroke}" fill="none"{cap}/>')
+
+
+def _symbol_svg(name: str, paths: Sequence[str]) -> str:
+    ''' Get SVG <symbol> fragment wrapping the given path fragments '''
+    return (f'<symbol id="{name}" width="{HexGrid.TILEW}" '
+            f'height="{HexGrid.TILEH}">' + ''.join(paths) + '</symbol>')
+
+
+@functools.lru_cache(maxsize=32)
+def _build_symbols(
+        widestroke: str,
+        thinstroke: str,
+        widecolor: str,
+        thincolor: str,
+        tiles: tuple[int, ...]) -> tuple[tuple[str, ...], str, str, str]:
+    ''' Build the tile <symbol> strings for the given stroke settings.
+        Paths shared between tiles (e.g. the a-f arc in tile1, tile2,
+        and the edge tile) are defined once and referenced by <use>.
+        Deterministic in its arguments, so cached for interactive
+        callers that rebuild with repeated settings.
+
+        Returns:
+            tilesymbols: <symbol> string for each enabled tile
+            edge: <symbol> string for the edge tile
+            corner: <symbol> string for the corner tile
+            pathdefs: <defs> string holding the shared <path> fragments
+    '''
+    paths: dict[tuple, str] = {}
+
+    def usepath(start, end, color, stroke, linecap=''):
+        ''' Get a <use> of the shared <path> for these arguments,
+            defining the path on first sight '''
+        key = (start, end, color, stroke, linecap)
+        name = paths.get(key)
+        if name is None:
+            name = f'p{len(paths)}'
+            paths[key] = name
+        return f'<use href="#{name}"/>'
+
+    tilesymbols = []
+    if 1 in tiles:
+        tilesymbols.append(_symbol_svg('tile1', (
+            usepath(a_, f_, widecolor, widestroke),
+            usepath(a__, f__, thincolor, thinstroke),
+            usepath(b_, c_, widecolor, widestroke),
+            usepath(b__, c__, thincolor, thinstroke),
+            usepath(d_, e_, widecolor, widestroke),
+            usepath(d__, e__, thincolor, thinstroke))))
+
+    if 2 in tiles:
+        tilesymbols.append(_symbol_svg('tile2', (
+            usepath(a_, f_, widecolor, widestroke),
+            usepath(a__, f__, thincolor, thinstroke),
+            usepath(c_, d_, widecolor, widestroke),
+            usepath(c__, d__, thincolor, thinstroke),
+            usepath(b_, e_, widecolor, widestroke),
+            usepath(b__, e__, thincolor, thinstroke))))
+
+    if 3 in tiles:
+        tilesymbols.append(_symbol_svg('tile3', (
+            usepath(a_, d_, widecolor, widestroke),
+            usepath(a__, d__, thincolor, thinstroke),
+            usepath(b_, e_, widecolor, widestroke),
+            usepath(b__, e__, thincolor, thinstroke),
+            usepath(c_, f_, widecolor, widestroke),
+            usepath(c__, f__, thincolor, thinstroke))))
+
+    if 4 in tiles:
+        tilesymbols.append(_symbol_svg('tile4', (
+            usepath(a_, c_, widecolor, widestroke),
+            usepath(a__, c__, thincolor, thinstroke),
+            usepath(b_, f_, widecolor, widestroke),
+            usepath(b__, f__, thincolor, thinstroke),
+            usepath(d_, e_, widecolor, widestroke),
+            usepath(d__, e__, thincolor, thinstroke))))
+
+    # Tile to go on edges of big hexagon
+    edge = _symbol_svg('edge', (
+        usepath(a_, f_, widecolor, widestroke),
+        usepath(a__, f__, thincolor, thinstroke)))
+
+    # Tile to go on corners of big hexagon
+    corner = _symbol_svg('corner', (
+        usepath(a_, None, widecolor, widestroke, linecap='round'),
+        usepath(a, None, thincolor, thinstroke, linecap='round')))
+
+    pathdefs = '<defs>' + ''.join(
+        make_path(*key, name=name) for key, name in paths.items()) + '</defs>'
+    return tuple(tilesymbols), edge, corner, pathdefs
+
+
+# Prebuild the symbols for the script's default parameters so the first
+# build_hex call with them (the __main__ block, or a pyscript/jupyter
+# cold start) is a cache hit
+_build_symbols('36', '8', 'black', 'white', (1, 2, 3, 4))
 
 
 def build_hex(
@@ -99,60 +185,14 @@ def build_hex(
             tiles: Number of tiles to include in the image
     '''
     dwg = HexGrid(size=size, borders=border)
-
-    if 1 in tiles:
-        tile1 = basesymbol('tile1')
-        tile1.append(path(a_, f_, widecolor, widestroke))
-        tile1.append(path(a__, f__, thincolor, thinstroke))
-        tile1.append(path(b_, c_, widecolor, widestroke))
-        tile1.append(path(b__, c__, thincolor, thinstroke))
-        tile1.append(path(d_, e_,  widecolor, widestroke))
-        tile1.append(path(d__, e__,  thincolor, thinstroke))
-        dwg.add_tile(tile1)
-
-    if 2 in tiles:
-        tile2 = basesymbol('tile2')
-        tile2.append(path(a_, f_, widecolor, widestroke))
-        tile2.append(path(a__, f__, thincolor, thinstroke))
-        tile2.append(path(c_, d_, widecolor, widestroke))
-        tile2.append(path(c__, d__, thincolor, thinstroke))
-        tile2.append(path(b_, e_, widecolor, widestroke))
-        tile2.append(path(b__, e__, thincolor, thinstroke))
-        dwg.add_tile(tile2)
-
-    if 3 in tiles:
-        tile3 = basesymbol('tile3')
-        tile3.append(path(a_, d_, widecolor, widestroke))
-        tile3.append(path(a__, d__, thincolor, thinstroke))
-        tile3.append(path(b_, e_, widecolor, widestroke))
-        tile3.append(path(b__, e__, thincolor, thinstroke))
-        tile3.append(path(c_, f_, widecolor, widestroke))
-        tile3.append(path(c__, f__, thincolor, thinstroke))
-        dwg.add_tile(tile3)
-
-    if 4 in tiles:
-        tile4 = basesymbol('tile4')
-        tile4.append(path(a_, c_, widecolor, widestroke))
-        tile4.append(path(a__, c__, thincolor, thinstroke))
-        tile4.append(path(b_, f_, widecolor, widestroke))
-        tile4.append(path(b__, f__, thincolor, thinstroke))
-        tile4.append(path(d_, e_, widecolor, widestroke))
-        tile4.append(path(d__, e__, thincolor, thinstroke))
-        dwg.add_tile(tile4)
-
-    # Tile to go on edges of big hexagon
-    tile_edge = basesymbol('edge')
-    tile_edge.append(path(a_, f_, widecolor, widestroke))
-    tile_edge.append(path(a__, f__, thincolor, thinstroke))
-    dwg.add_edge_tile(tile_edge)
-
-    # Tile to go on corners of big hexagon
-    tile_corner = basesymbol('corner')
-    tile_corner.append(path(a_, None, widecolor, widestroke))
-    tile_corner.append(path(a, None, thincolor, thinstroke))
-    for p in tile_corner.findall('path'):
-        p.set('stroke-linecap', 'round')
-    dwg.add_corner_tile(tile_corner)
+    tilesymbols, edge, corner, pathdefs = _build_symbols(
+        widestroke, thinstroke, widecolor, thincolor, tuple(tiles))
+
+    dwg.add_def(pathdefs)
+    for symbol in tilesymbols:
+        dwg.add_tile(symbol)
+    dwg.add_edge_tile(edge)
+    dwg.add_corner_tile(corner)
     return dwg
 
 
@@ -169,8 +209,8 @@ if __name__ == '__main__':
         tiles=(1,2,3,4))    # Remove numbers to disable that tile
 
     with open('hexagon.svg', 'w') as f:
-        f.write(ET.tostring(dwg.draw(), encoding='unicode'))
+        dwg.write(f)
 
     # Uncomment this to preview each tile by themselves
     #with open('tiles.svg', 'w') as f:
-    #    f.write(ET.tostring(dwg.view_tiles()).deocde('utf-8'))
+    #    f.write(dwg.view_tiles())
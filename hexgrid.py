@@ -1,16 +1,120 @@
 ''' Base class for drawing hexagonal truchet grid to SVG '''
 
 from xml.etree import ElementTree as ET
+from array import array
+import functools
 import math
 import random
 
 
+# Border rotation lookup tables. Keys are (sq, sr, ss) where sq is
+# sign(q) if |q| == size-1 else 0, and likewise for r and s, so each key
+# identifies which side(s) of the hexagon a border cell sits on.
+# _EDGE_ROT also covers corner keys for when no corner tile is defined,
+# and the degenerate (0, 0, 0) key covers a size-1 grid.
+_CORNER_ROT = {
+    (0, -1, 1): 4,
+    (1, -1, 0): 5,
+    (0, 1, -1): 1,
+    (-1, 0, 1): 3,
+    (-1, 1, 0): 2,
+    (1, 0, -1): 0,
+    (0, 0, 0): 4,
+}
+_EDGE_ROT = {
+    (0, 1, 0): 2,
+    (0, -1, 0): -1,
+    (0, 0, 1): 4,
+    (-1, 0, 0): 3,
+    (1, 0, 0): 0,
+    (0, 0, -1): 1,
+    (0, -1, 1): -1,
+    (1, -1, 0): -1,
+    (0, 1, -1): 2,
+    (-1, 0, 1): 4,
+    (-1, 1, 0): 2,
+    (1, 0, -1): 0,
+    (0, 0, 0): 2,
+}
+
+
+# Rotation angle strings for each rotate factor. A rotate of -1
+# wraps to '300', equivalent to the -60 degrees it represents.
+_ROT_ANGLES = ('', '60', '120', '180', '240', '300')
+
+# Top-level SVG document template. The whole drawing is emitted with
+# one format_map call over prejoined fragment strings.
+_SVG_TMPL = ('<svg viewBox="{view}" width="{w}" height="{h}" '
+             'xmlns="http://www.w3.org/2000/svg"{xlink}>'
+             '{defs}<g>{body}</g></svg>')
+_XLINK_NS = ' xmlns:xlink="http://www.w3.org/1999/xlink"'
+
+
+def _symbol_id(symbol: str) -> str:
+    ''' Extract the id attribute from a <symbol> fragment string '''
+    return symbol.partition('id="')[2].partition('"')[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _grid_cells(size: int) -> tuple[list, list, list]:
+    ''' Classify every (q, r) cell of a grid of the given size.
+
+        The classification is fully determined by `size`, so it is
+        computed once and cached rather than re-branching over every
+        cell on each draw.
+
+        Rotation codes are packed in int8 arrays parallel to the
+        position lists.
+
+        Returns:
+            interior: list of (x, y) cells inside the border
+            edges: ((x, y) list, rotation array) for border cells
+            corners: ((x, y) list, rotation array, edge-rotation array)
+                for corner cells, where the edge rotation applies if no
+                corner tiles are defined
+    '''
+    interior = []
+    edges = []
+    edgerots = array('b')
+    corners = []
+    cornerrots = array('b')
+    corneredgerots = array('b')
+    tilew = HexGrid.TILEW
+    tileh = HexGrid.TILEH
+    for q in range(-size+1, size):
+        # |q+r| <= size-1 bounds r directly, so only valid cells are visited
+        for r in range(max(-size+1, -size+1-q), min(size, size-q)):
+            # Convert axial (q, r) to x, y position
+            col = q + (r - r % 2) // 2
+            x = col*tilew + (r % 2)*(tilew/2) - tilew/2
+            y = r*(tileh*3/4) - tileh/2
+
+            s = -q-r
+            if max(abs(q), abs(r), abs(s)) == size-1:  # On the border
+                key = ((q > 0) - (q < 0) if abs(q) == size-1 else 0,
+                       (r > 0) - (r < 0) if abs(r) == size-1 else 0,
+                       (s > 0) - (s < 0) if abs(s) == size-1 else 0)
+                rotate = _EDGE_ROT[key]
+                if q == 0 or r == 0 or s == 0:  # On a corner
+                    corners.append((x, y))
+                    cornerrots.append(_CORNER_ROT[key])
+                    corneredgerots.append(rotate)
+                else:
+                    edges.append((x, y))
+                    edgerots.append(rotate)
+            else:
+                interior.append((x, y))
+    return interior, (edges, edgerots), (corners, cornerrots, corneredgerots)
+
+
 class HexGrid:
     ''' Hexagonal Grid for placing Truchet Tiles.
 
         Args:
             size: Number of tiles along one edge of the grid
             borders: Draw borders around each tile
+            legacy_xlink: Also emit SVG 1.1 xlink:href attributes on
+                tile references for old renderers
 
         Class Attributes:
             TILEH: Height of one tile (point to point)
@@ -37,175 +141,184 @@ class HexGrid:
     VERT_E = f'{TILEW/2} {TILEH}'
     VERT_F = f'0 {3*TILEH/4}' 
 
-    def __init__(self, size: int, borders: bool = False):
+    def __init__(self, size: int, borders: bool = False,
+                 legacy_xlink: bool = False):
         self.size = size
         self.tiles = []
         self.edgetiles = []
         self.cornertiles = []
         self.borders = borders
+        self.legacy_xlink = legacy_xlink
 
         width = self.TILEW * 2 * self.size - self.TILEW
         height = width * math.sqrt(3)/2
 
-        self.svg = ET.Element('svg')
-        self.svg.set('viewBox', f'{-width/2} {-height/2} {width} {height}')
-        self.svg.set('width', f'{width}')
-        self.svg.set('height', f'{height}')
-        self.svg.set('xmlns', 'http://www.w3.org/2000/svg')
-        self.svg.set('xmlns:xlink', 'http://www.w3.org/1999/xlink')
+        # Assemble the SVG from string fragments rather than an ElementTree,
+        # avoiding per-tile Element allocation and serialization
+        self._view = f'{-width/2} {-height/2} {width} {height}'
+        self._width = width
+        self._height = height
+        self._defs_xml: list[str] = []
+        self._symbol_xml: list[str] = []
+        self._use_fragments: list[str] = []
 
     def _repr_svg_(self):
         ''' SVG representer for use in pyscript/jupyter '''
-        return ET.tostring(self.draw())
+        return self.draw_str()
+
+    def _border_path(self) -> str:
+        ''' Get <path> fragment outlining a tile hexagon '''
+        return (f'<path d="M {self.VERT_A} L {self.VERT_B} {self.VERT_C} '
+                f'{self.VERT_D} {self.VERT_E} {self.VERT_F} Z" '
+                'stroke="gray" fill="none"/>')
 
-    def _add_symbol(self, symbol: ET.Element):
+    def _add_symbol(self, symbol: str):
         ''' Add a <symbol> to the SVG definitions '''
         if self.borders:
-            border = ET.SubElement(symbol, 'path')
-            border.set('d', f'M {self.VERT_A} L {self.VERT_B} {self.VERT_C} '
-                            f'{self.VERT_D} {self.VERT_E} {self.VERT_F} Z')
-            border.set('stroke', 'gray')
-            border.set('fill', 'none')
-        self.svg.append(symbol)
-
-    def add_tile(self, symbol: ET.Element):
+            symbol = symbol.replace('</symbol>', self._border_path() + '</symbol>')
+        self._symbol_xml.append(symbol)
+
+    def add_def(self, xml: str):
+        ''' Add a raw SVG definition fragment (e.g. shared <path>
+            elements inside a <defs> block) to the drawing
+        '''
+        self._defs_xml.append(xml)
+
+    def add_tile(self, symbol: str):
         ''' Add a symbol to the drawing. Symbol must be a
-            <symbol> element with an `id` attribute, and may
+            <symbol> fragment string with an `id` attribute, and may
             define any SVG drawing elements within.
         '''
-        self.tiles.append(symbol)
+        self.tiles.append(_symbol_id(symbol))
         self._add_symbol(symbol)
 
-    def add_edge_tile(self, symbol: ET.Element):
+    def add_edge_tile(self, symbol: str):
         ''' Add a symbol to the drawing for use along the grid edges.
-            Symbol must be a <symbol> element with an `id` attribute,
+            Symbol must be a <symbol> fragment string with an `id` attribute,
             and may define any SVG drawing elemements within.
             Tile will be rotated to align edges `a` and `f` with the grid.
         '''
-        self.edgetiles.append(symbol)
+        self.edgetiles.append(_symbol_id(symbol))
         self._add_symbol(symbol)
 
-    def add_corner_tile(self, symbol: ET.Element):
+    def add_corner_tile(self, symbol: str):
         ''' Add a symbol to the drawing for use on the grid corners.
-            Symbol must be a <symbol> element with an `id` attribute,
+            Symbol must be a <symbol> fragment string with an `id` attribute,
             and may define any SVG drawing elemements within.
             Tile will be rotated to align edge `a` with the grid.
         '''
-        self.cornertiles.append(symbol)
+        self.cornertiles.append(_symbol_id(symbol))
         self._add_symbol(symbol)
 
     def draw(self) -> ET.Element:
-        ''' Place all the tiles, randomly selecting tiles from
-            the list of regular tiles, edge tiles, and corner tiles,
-            and randomly applying rotation to the regular tiles.
+        ''' Place all the tiles and return the drawing as an SVG Element '''
+        return ET.fromstring(self.draw_str())
+
+    def draw_str(self) -> str:
+        ''' Place all the tiles and return the drawing as an SVG string '''
+        self._place_tiles()
+        return _SVG_TMPL.format_map({
+            'view': self._view,
+            'w': self._width,
+            'h': self._height,
+            'xlink': _XLINK_NS if self.legacy_xlink else '',
+            'defs': ''.join(self._defs_xml) + ''.join(self._symbol_xml),
+            'body': ''.join(self._use_fragments)})
+
+    def write(self, fp):
+        ''' Place all the tiles and stream the SVG to an open text
+            file, without building the full document string in memory
         '''
-        group = ET.SubElement(self.svg, 'g')
-        for q in range(-self.size+1, self.size):
-            for r in range(-self.size+1, self.size):
-                if abs(q+r) > self.size-1: continue
-
-                s = -q-r
-                if max(abs(q), abs(r), abs(s)) == self.size-1:  # On the border
-                    if (q==0 or r==0 or s==0) and len(self.cornertiles):  # On a corner
-                        # There's probably more elegant ways to do this...
-                        rotate = 0
-                        if q == 0 and s == self.size-1:
-                            rotate=4
-                        elif s == 0 and q == self.size-1:
-                            rotate=5
-                        elif q == 0 and r == self.size-1:
-                            rotate=1
-                        elif r == 0 and s == self.size-1:
-                            rotate=3
-                        elif s == 0 and r == self.size-1:
-                            rotate=2
-                        tile = random.choice(self.cornertiles)
-                        self._draw_tile(tile, q, r, rotate=rotate, zorder=0)
-
-                    elif len(self.edgetiles):
-                        rotate = 1
-                        if r == self.size - 1:
-                            rotate = 2
-                        elif r == -self.size + 1:
-                            rotate = -1
-                        elif s == self.size - 1:
-                            rotate = 4
-                        elif q == -self.size + 1:
-                            rotate = 3
-                        elif q == self.size - 1:
-                            rotate = 0
-                        tile = random.choice(self.edgetiles)
-                        self._draw_tile(tile, q, r, rotate=rotate)
+        self._place_tiles()
+        head, rest = _SVG_TMPL.split('{defs}')
+        mid, tail = rest.split('{body}')
+        fp.write(head.format_map({
+            'view': self._view,
+            'w': self._width,
+            'h': self._height,
+            'xlink': _XLINK_NS if self.legacy_xlink else ''}))
+        for xml in self._defs_xml:
+            fp.write(xml)
+        for symbol in self._symbol_xml:
+            fp.write(symbol)
+        fp.write(mid)
+        for use in self._use_fragments:
+            fp.write(use)
+        fp.write(tail)
 
-                else:
-                    tile = random.choice(self.tiles)
-                    self._draw_tile(tile, q, r, rotate=random.randint(0, 5))
-        return self.svg
+    def _place_tiles(self):
+        ''' Randomly select tiles from the list of regular tiles, edge
+            tiles, and corner tiles, randomly rotate the regular tiles,
+            and fill the <use> fragment list with their placements.
+        '''
+        self._use_fragments = []
+        interior, (edges, edgerots), (corners, cornerrots, corneredgerots) = \
+            _grid_cells(self.size)
 
-    def _draw_tile(self, tile: ET.Element, q: int, r: int, rotate: int = 0,
+        # Sample all the random tile picks and rotations in bulk rather
+        # than one random.choice/randint call per tile
+        if len(self.cornertiles):
+            picks = random.choices(self.cornertiles, k=len(corners))
+            for (x, y), rotate, tile in zip(corners, cornerrots, picks):
+                self._draw_tile(tile, x, y, rotate=rotate, zorder=0)
+        elif len(self.edgetiles):
+            picks = random.choices(self.edgetiles, k=len(corners))
+            for (x, y), rotate, tile in zip(corners, corneredgerots, picks):
+                self._draw_tile(tile, x, y, rotate=rotate)
+
+        if len(self.edgetiles):
+            picks = random.choices(self.edgetiles, k=len(edges))
+            for (x, y), rotate, tile in zip(edges, edgerots, picks):
+                self._draw_tile(tile, x, y, rotate=rotate)
+
+        picks = random.choices(self.tiles, k=len(interior))
+        rotations = random.choices(range(6), k=len(interior))
+        for (x, y), tile, rotate in zip(interior, picks, rotations):
+            self._draw_tile(tile, x, y, rotate=rotate)
+
+    def _draw_tile(self, name: str, x: float, y: float, rotate: int = 0,
                    zorder: int = 1):
         ''' Draw one tile in the grid
 
             Args:
-                tile: The tile symbol to draw (added to svg via <use>)
-                q: Diagonal coordinate for tile
-                r: Horizontal coordinate for tile
+                name: The id of the tile symbol to draw (added to
+                    svg via <use>)
+                x: Horizontal position of tile bounding box
+                y: Vertical position of tile bounding box
                 rotate: Rotation factor, integer from 0-4 (as multipler
                     of 60 degrees)
                 zorder: Allow corner tiles to be placed underneath
-
-            Note: See https://www.redblobgames.com/grids/hexagons/
-                for description of (q, r) coordinate system.
         '''
-        name = tile.get('id')
-        group = self.svg.find('g')
-        use = ET.Element('use')
-        use.set('href', f'#{name}')
-        use.set('xlink:href', f'#{name}')
-
+        transform = ''
+        if rotate != 0:
+            transform = (f' transform="rotate({_ROT_ANGLES[rotate]}, '
+                         f'{x+self.TILEW/2} {y+self.TILEH/2})"')
+        xhref = f' xlink:href="#{name}"' if self.legacy_xlink else ''
+        use = f'<use href="#{name}"{xhref} x="{x}" y="{y}"{transform}/>'
         if zorder == 0:
-            group.insert(0, use)
+            self._use_fragments.insert(0, use)
         else:
-            group.append(use)
-
-        # Convert axial to grid coordinates
-        col = q + (r - r % 2) // 2
-        row = r
-
-        # Convert to x, y position
-        x = col*self.TILEW + (row%2)*(self.TILEW/2) - self.TILEW/2
-        y = row*(self.TILEH*3/4) - self.TILEH/2
-        use.set('x', str(x))
-        use.set('y', str(y))
-        if rotate != 0:
-            theta = rotate * 60
-            use.set('transform', f'rotate({theta}, {x+self.TILEW/2} {y+self.TILEH/2})')
+            self._use_fragments.append(use)
 
-    def view_tiles(self) -> ET.Element:
+    def view_tiles(self) -> str:
         ''' Create an SVG showing each tile by itself '''
         gap = 15
+        tiles = self.tiles + self.edgetiles + self.cornertiles
         width = (self.TILEW + gap) * len(tiles)
         height = self.TILEH + gap
 
-        svg = ET.Element('svg')
-        svg.set('viewBox', f'0 0 {width} {height}')
-        svg.set('width', f'{width}')
-        svg.set('height', f'{height}')
-        svg.set('xmlns', 'http://www.w3.org/2000/svg')
-        svg.set('xmlns:xlink', 'http://www.w3.org/1999/xlink')
-
-        tiles = self.tiles + self.edgetiles + self.cornertiles
-        for i, tile in enumerate(tiles):
-            border = ET.SubElement(tile, 'path')
-            border.set('d', f'M {self.VERT_A} L {self.VERT_B} {self.VERT_C} '
-                            f'{self.VERT_D} {self.VERT_E} {self.VERT_F} Z')
-            border.set('stroke', 'gray')
-            border.set('fill', 'none')
-            svg.append(tile)
-            name = tile.get('id')
-            use = ET.SubElement(svg, 'use')
-            use.set('href', f'#{name}')
-            use.set('xlink:href', f'#{name}')
-            use.set('x', str(gap/2 + i*(self.TILEW + gap)))
-            use.set('y', f'{gap/2}')
-        return svg
+        border = self._border_path()
+        defs = list(self._defs_xml)
+        uses = []
+        for i, (name, symbol) in enumerate(zip(tiles, self._symbol_xml)):
+            defs.append(symbol.replace('</symbol>', border + '</symbol>'))
+            x = gap/2 + i*(self.TILEW + gap)
+            xhref = f' xlink:href="#{name}"' if self.legacy_xlink else ''
+            uses.append(f'<use href="#{name}"{xhref} x="{x}" y="{gap/2}"/>')
+        return _SVG_TMPL.format_map({
+            'view': f'0 0 {width} {height}',
+            'w': width,
+            'h': height,
+            'xlink': _XLINK_NS if self.legacy_xlink else '',
+            'defs': ''.join(defs),
+            'body': ''.join(uses)})